@@ -1,13 +1,44 @@
-from typing import Dict, List, Optional
-import difflib
-from threading import Lock
-
-from fastapi import FastAPI, HTTPException, Query
+import asyncio
+import hashlib
+import os
+from collections import Counter, defaultdict
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Any, AsyncIterator, Callable, DefaultDict, Dict, Iterable, List, Optional, Set, Tuple
+
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
-
-
-app = FastAPI(title="Catalog and Cart API")
+from fastapi.responses import ORJSONResponse, Response
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.redis import RedisBackend
+from fastapi_cache.decorator import cache
+import orjson
+from pydantic import BaseModel, ConfigDict, Field
+from rapidfuzz import fuzz, process
+from redis import asyncio as aioredis
+
+
+# Share search responses and carts across workers through Redis when
+# configured; otherwise carts are per-process and search is not response-cached.
+REDIS_URL = os.environ.get("REDIS_URL")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    global _redis
+    if REDIS_URL:
+        _redis = aioredis.from_url(REDIS_URL)
+        FastAPICache.init(RedisBackend(_redis), prefix="catalog")
+    try:
+        yield
+    finally:
+        if _redis is not None:
+            await _redis.close()
+            _redis = None
+
+
+# orjson renders every response body in C instead of stdlib json
+app = FastAPI(title="Catalog and Cart API", default_response_class=ORJSONResponse, lifespan=lifespan)
 
 # Allow cross-origin requests (broad for demo; tighten origins for prod)
 app.add_middleware(
@@ -44,12 +75,42 @@ CATALOG: Dict[str, Dict[str, object]] = {
 
 
 class Product(BaseModel):
+    # Frozen so the shared instances in _PRODUCT_CACHE can't be mutated per request
+    model_config = ConfigDict(frozen=True)
+
     id: str
     name: str
     unit: str
     price: float
 
 
+# Catalog lookup structures, built once at import since CATALOG is fixed.
+# Response models below are built with model_construct: the data comes from this
+# trusted in-process catalog, so Pydantic validation would only repeat work.
+_PRODUCT_CACHE: Dict[str, Product] = {
+    pid: Product.model_construct(id=pid, name=data["name"], unit=data["unit"], price=float(data["price"]))
+    for pid, data in CATALOG.items()
+}
+# Normalized (lowercase) name -> product_id, used for fuzzy matching on the name
+_NAME_LOWER_TO_PID: Dict[str, str] = {data["name"].lower(): pid for pid, data in CATALOG.items()}
+_ALL_NAMES_LOWER = tuple(_NAME_LOWER_TO_PID)
+_PID_TO_NAME_LOWER: Dict[str, str] = {pid: name for name, pid in _NAME_LOWER_TO_PID.items()}
+_CATALOG_RANK: Dict[str, int] = {pid: rank for rank, pid in enumerate(CATALOG)}
+
+# Full catalog listing, serialized once; /products serves these bytes as-is
+_CATALOG_BYTES = orjson.dumps([product.model_dump() for product in _PRODUCT_CACHE.values()])
+_CATALOG_ETAG = f'"{hashlib.md5(_CATALOG_BYTES, usedforsecurity=False).hexdigest()}"'
+
+
+# Inverted index: token -> product_ids. Tokens come from the lowercase name
+# split on whitespace plus the product_id split on underscores.
+_TOKEN_INDEX: Dict[str, Set[str]] = {}
+for _pid, _name in _PID_TO_NAME_LOWER.items():
+    for _token in _name.split() + _pid.split("_"):
+        _TOKEN_INDEX.setdefault(_token, set()).add(_pid)
+del _pid, _name, _token
+
+
 class SearchResult(BaseModel):
     query: str
     found: bool
@@ -77,118 +138,311 @@ class RemoveFromCartRequest(BaseModel):
 
 
 class CartItem(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     product_id: str
     name: str
     quantity: int
 
 
 class CartResponse(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     user_id: str
     items: List[CartItem]
     total_items: int
 
 
-_carts: Dict[str, Dict[str, int]] = {}
-_cart_lock = Lock()
-
+# Redis client set by lifespan when REDIS_URL is configured. Carts then live
+# in Redis hashes (cart:{user_id} -> {product_id: quantity}) shared by every
+# worker; otherwise they are kept in the in-process dicts below.
+_redis: Optional[aioredis.Redis] = None
+
+_carts: DefaultDict[str, Dict[str, int]] = defaultdict(dict)
+# Running item count per cart, kept in step with _carts by the add/remove paths
+_cart_totals: Dict[str, int] = {}
+
+# Striped locks: each user hashes to one shard, so carts of different users
+# can be modified concurrently while a single user's cart stays serialized.
+# Endpoints run on the event loop, so these are asyncio locks rather than
+# threading locks that would park threadpool workers.
+_SHARDS = 64
+_cart_locks = [asyncio.Lock() for _ in range(_SHARDS)]
+
+
+def _lock_for(user_id: str) -> asyncio.Lock:
+    return _cart_locks[hash(user_id) % _SHARDS]
+
+
+def _merge_items(items: List[ModifyItem]) -> Dict[str, int]:
+    """Validate product IDs up front and sum quantities per distinct product."""
+    unknown = [item.product_id for item in items if item.product_id not in _PRODUCT_CACHE]
+    if unknown:
+        raise HTTPException(status_code=404, detail=f"Products not found in catalog: {unknown}")
+
+    quantities: Dict[str, int] = Counter()
+    for item in items:
+        quantities[item.product_id] += item.quantity
+    return quantities
+
+
+# Atomically checks that every product is in the cart, then decrements each
+# and drops those that reach zero. ARGV holds product_id, quantity pairs.
+_REDIS_REMOVE_SCRIPT = """
+for i = 1, #ARGV, 2 do
+    if redis.call('HEXISTS', KEYS[1], ARGV[i]) == 0 then
+        return {0, ARGV[i]}
+    end
+end
+for i = 1, #ARGV, 2 do
+    if redis.call('HINCRBY', KEYS[1], ARGV[i], -tonumber(ARGV[i + 1])) <= 0 then
+        redis.call('HDEL', KEYS[1], ARGV[i])
+    end
+end
+return {1, redis.call('HGETALL', KEYS[1])}
+"""
+
+
+def _redis_cart_key(user_id: str) -> str:
+    return f"cart:{user_id}"
+
+
+async def _redis_cart(key: str, pairs: Iterable[Tuple[bytes, bytes]]) -> Dict[str, int]:
+    """Decode HGETALL pairs, dropping product IDs no longer in the catalog."""
+    cart: Dict[str, int] = {}
+    stale: List[str] = []
+    for raw_pid, raw_qty in pairs:
+        pid = raw_pid.decode()
+        if pid in _PRODUCT_CACHE:
+            cart[pid] = int(raw_qty)
+        else:
+            stale.append(pid)
+    if stale:
+        await _redis.hdel(key, *stale)
+    return cart
+
+
+async def _redis_add(user_id: str, quantities: Dict[str, int]) -> Dict[str, int]:
+    key = _redis_cart_key(user_id)
+    async with _redis.pipeline(transaction=True) as pipe:
+        for pid, qty in quantities.items():
+            pipe.hincrby(key, pid, qty)
+        pipe.hgetall(key)
+        *_, raw = await pipe.execute()
+    return await _redis_cart(key, raw.items())
+
+
+async def _redis_remove(user_id: str, quantities: Dict[str, int]) -> Dict[str, int]:
+    key = _redis_cart_key(user_id)
+    args = [value for pid, qty in quantities.items() for value in (pid, qty)]
+    ok, payload = await _redis.eval(_REDIS_REMOVE_SCRIPT, 1, key, *args)
+    if not ok:
+        raise HTTPException(status_code=404, detail=f"{_PRODUCT_CACHE[payload.decode()].name} not in cart")
+    return await _redis_cart(key, zip(payload[::2], payload[1::2]))
+
+
+def _index_lookup(q_norm: str) -> Optional[Product]:
+    """Return the product whose tokens contain every query token, if any."""
+    candidates: Optional[Set[str]] = None
+    for token in q_norm.split():
+        postings = _TOKEN_INDEX.get(token)
+        if not postings:
+            return None
+        candidates = set(postings) if candidates is None else candidates & postings
+        if not candidates:
+            return None
+
+    if not candidates:
+        return None
+    if len(candidates) == 1:
+        return _PRODUCT_CACHE[next(iter(candidates))]
+
+    # Several products share all query tokens (e.g. "mix"); rank just those by
+    # score, breaking ties by catalog order like the full fuzzy scan does
+    choices = {pid: _PID_TO_NAME_LOWER[pid] for pid in sorted(candidates, key=_CATALOG_RANK.__getitem__)}
+    _, _, pid = process.extractOne(q_norm, choices, scorer=fuzz.WRatio)
+    return _PRODUCT_CACHE[pid]
+
+
+# Plain ratio (same measure as difflib's SequenceMatcher.ratio, scaled to 0-100)
+# with difflib's old 0.4 cutoff. WRatio's partial-ratio component has no cutoff
+# that separates typos from unrelated words on these short names.
+_FUZZY_CUTOFF = 40
+
+
+# CATALOG is immutable at runtime, so a normalized query always resolves to the
+# same product; call _search_one.cache_clear() if the catalog ever changes.
+@lru_cache(maxsize=4096)
+def _search_one(q_norm: str) -> Optional[Product]:
+    matched_product = None
+
+    # 1. Exact ID match
+    if q_norm in _PRODUCT_CACHE:
+        matched_product = _PRODUCT_CACHE[q_norm]
+    # Exact name match skips the fuzzy scan entirely
+    elif q_norm in _NAME_LOWER_TO_PID:
+        matched_product = _PRODUCT_CACHE[_NAME_LOWER_TO_PID[q_norm]]
+
+    # 2. Token index match on name/ID words
+    if not matched_product:
+        matched_product = _index_lookup(q_norm)
+
+    # 3. Fuzzy name match if nothing matched exactly
+    if not matched_product:
+        # extractOne details:
+        # returns the single best (name, score, index) or None
+        # score_cutoff: match threshold (0 to 100), see _FUZZY_CUTOFF
+        hit = process.extractOne(q_norm, _ALL_NAMES_LOWER, scorer=fuzz.ratio, score_cutoff=_FUZZY_CUTOFF)
+        if hit:
+            matched_product = _PRODUCT_CACHE[_NAME_LOWER_TO_PID[hit[0]]]
+
+    return matched_product
+
+
+def _cart_response(user_id: str, cart: Dict[str, int], total_items: int) -> CartResponse:
+    response_items = [
+        CartItem.model_construct(product_id=pid, name=_PRODUCT_CACHE[pid].name, quantity=qty)
+        for pid, qty in cart.items()
+    ]
+    return CartResponse.model_construct(user_id=user_id, items=response_items, total_items=total_items)
 
-def _catalog_product(product_id: str) -> Product:
-    if product_id not in CATALOG:
-        raise HTTPException(status_code=404, detail="Product not found in catalog")
 
-    data = CATALOG[product_id]
-    return Product(id=product_id, name=data["name"], unit=data["unit"], price=float(data["price"]))
+def _redis_cached(func: Callable[..., Any]) -> Callable[..., Any]:
+    # Only cache responses in Redis: a local response cache is unbounded and,
+    # with _search_one already memoized, slower than recomputing.
+    if not REDIS_URL:
+        return func
+    return cache(expire=3600, key_builder=_search_cache_key)(func)
 
 
-def _cart_response(user_id: str, cart: Dict[str, int]) -> CartResponse:
-    response_items = [
-        CartItem(product_id=pid, name=CATALOG[pid]["name"], quantity=qty) for pid, qty in cart.items()
-    ]
-    total_items = sum(item.quantity for item in response_items)
-    return CartResponse(user_id=user_id, items=response_items, total_items=total_items)
+def _search_cache_key(func: Callable[..., Any], namespace: str = "", *, request: Request, **_: Any) -> str:
+    # Results follow the order of the queries, so the key must keep it too. The
+    # catalog ETag scopes entries to this catalog, so a deploy that changes it
+    # stops every worker from serving results cached against the old one.
+    queries = orjson.dumps(request.query_params.getlist("queries")).decode()
+    return f"{namespace}:{_CATALOG_ETAG}:{queries}"
 
 
 @app.get("/health")
-def health() -> Dict[str, str]:
+async def health() -> Dict[str, str]:
     return {"status": "ok"}
 
 
-@app.get("/products/search", response_model=BulkSearchResponse)
-def search_products(queries: List[str] = Query(...)) -> BulkSearchResponse:
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against etag (RFC 9110 13.1.2)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+@app.get("/products", response_model=List[Product])
+async def list_products(request: Request) -> Response:
+    headers = {"ETag": _CATALOG_ETAG}
+    if _etag_matches(request.headers.get("if-none-match"), _CATALOG_ETAG):
+        return Response(status_code=304, headers=headers)
+    return Response(content=_CATALOG_BYTES, media_type="application/json", headers=headers)
+
+
+# Search is pure over the fixed catalog; cart endpoints are user-scoped and
+# mutable, so they are deliberately not cached.
+#
+# `queries` is read straight from the query string rather than declared as a
+# Query(...) parameter, skipping per-value validation on large bulk searches;
+# openapi_extra keeps it documented.
+@app.get(
+    "/products/search",
+    response_model=BulkSearchResponse,
+    openapi_extra={
+        "parameters": [
+            {
+                "name": "queries",
+                "in": "query",
+                "required": True,
+                "schema": {"type": "array", "items": {"type": "string"}},
+            }
+        ]
+    },
+)
+@_redis_cached
+async def search_products(request: Request) -> BulkSearchResponse:
+    queries = request.query_params.getlist("queries")
     if not queries:
         raise HTTPException(status_code=400, detail="Query list must not be empty")
 
     results: List[SearchResult] = []
     not_found_queries: List[str] = []
 
-    # Prepare a mapping of normalized name -> product_id for fuzzy matching
-    # We use all lowercase for simpler matching on the name
-    name_to_pid = {pdata["name"].lower(): pid for pid, pdata in CATALOG.items()}
-    all_names = list(name_to_pid.keys())
+    # Resolve each distinct normalized query once, then fan results back out
+    normalized = [q.lower().strip() for q in queries]
+    resolved = {q_norm: _search_one(q_norm) for q_norm in dict.fromkeys(normalized) if q_norm}
 
-    for q in queries:
-        q_norm = q.lower().strip()
+    for q, q_norm in zip(queries, normalized):
         if not q_norm:
             continue
 
-        matched_product = None
-        
-        # 1. Exact ID match
-        if q_norm in CATALOG:
-             data = CATALOG[q_norm]
-             matched_product = Product(id=q_norm, name=data["name"], unit=data["unit"], price=float(data["price"]))
-        
-        # 2. Fuzzy name match if no ID match
-        if not matched_product:
-            # get_close_matches details:
-            # n=1: return top 1 best match
-            # cutoff=0.4: match threshold (0.0 to 1.0)
-            matches = difflib.get_close_matches(q_norm, all_names, n=1, cutoff=0.4)
-            if matches:
-                best_match_name = matches[0]
-                pid = name_to_pid[best_match_name]
-                data = CATALOG[pid]
-                matched_product = Product(id=pid, name=data["name"], unit=data["unit"], price=float(data["price"]))
-
+        matched_product = resolved[q_norm]
         if matched_product:
-            results.append(SearchResult(query=q, found=True, product=matched_product))
+            results.append(SearchResult.model_construct(query=q, found=True, product=matched_product))
         else:
-            results.append(SearchResult(query=q, found=False, product=None))
+            results.append(SearchResult.model_construct(query=q, found=False, product=None))
             not_found_queries.append(q)
 
-    return BulkSearchResponse(results=results, not_found=not_found_queries)
+    return BulkSearchResponse.model_construct(results=results, not_found=not_found_queries)
 
 
 @app.post("/cart/add", response_model=CartResponse)
-def add_to_cart(request: AddToCartRequest) -> CartResponse:
-    with _cart_lock:
-        cart = _carts.setdefault(request.user_id, {})
+async def add_to_cart(request: AddToCartRequest) -> CartResponse:
+    quantities = _merge_items(request.items)
+
+    if _redis is not None:
+        cart = await _redis_add(request.user_id, quantities)
+        return _cart_response(request.user_id, cart, sum(cart.values()))
 
-        for item in request.items:
-            product = _catalog_product(item.product_id)
-            current_qty = cart.get(product.id, 0)
-            cart[product.id] = current_qty + item.quantity
+    added = sum(quantities.values())
 
-        return _cart_response(request.user_id, cart)
+    async with _lock_for(request.user_id):
+        cart = _carts[request.user_id]
+        for pid, qty in quantities.items():
+            cart[pid] = cart.get(pid, 0) + qty
+        _cart_totals[request.user_id] = _cart_totals.get(request.user_id, 0) + added
+
+        return _cart_response(request.user_id, cart, _cart_totals.get(request.user_id, 0))
 
 
 @app.post("/cart/remove", response_model=CartResponse)
-def remove_from_cart(request: RemoveFromCartRequest) -> CartResponse:
-    with _cart_lock:
-        cart = _carts.setdefault(request.user_id, {})
-
-        for item in request.items:
-            product = _catalog_product(item.product_id)
-            if product.id not in cart:
-                raise HTTPException(status_code=404, detail=f"{product.name} not in cart")
-            current_qty = cart[product.id]
-            new_qty = current_qty - item.quantity
+async def remove_from_cart(request: RemoveFromCartRequest) -> CartResponse:
+    quantities = _merge_items(request.items)
+
+    if _redis is not None:
+        cart = await _redis_remove(request.user_id, quantities)
+        return _cart_response(request.user_id, cart, sum(cart.values()))
+
+    async with _lock_for(request.user_id):
+        cart = _carts[request.user_id]
+
+        for pid in quantities:
+            if pid not in cart:
+                raise HTTPException(status_code=404, detail=f"{_PRODUCT_CACHE[pid].name} not in cart")
+
+        removed = 0
+        for pid, qty in quantities.items():
+            current_qty = cart[pid]
+            new_qty = current_qty - qty
             if new_qty > 0:
-                cart[product.id] = new_qty
+                cart[pid] = new_qty
             else:
-                cart.pop(product.id, None)
+                del cart[pid]
+            removed += min(qty, current_qty)
+
+        total = _cart_totals.get(request.user_id, 0) - removed
+        if total > 0:
+            _cart_totals[request.user_id] = total
+        else:
+            _cart_totals.pop(request.user_id, None)
 
-        return _cart_response(request.user_id, cart)
+        return _cart_response(request.user_id, cart, _cart_totals.get(request.user_id, 0))
 
 
 # To run locally:
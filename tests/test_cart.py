@@ -0,0 +1,130 @@
+from collections import defaultdict
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import main
+
+
+@pytest.fixture(autouse=True)
+def memory_store(monkeypatch):
+    """Give each test empty in-process carts."""
+    monkeypatch.setattr(main, "_carts", defaultdict(dict))
+    monkeypatch.setattr(main, "_cart_totals", {})
+
+
+@pytest.fixture
+def redis_store(monkeypatch):
+    """Route cart endpoints to a fakeredis server; yields a sync client on it."""
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(main, "_redis", fakeredis.aioredis.FakeRedis(server=server))
+    return fakeredis.FakeRedis(server=server)
+
+
+@pytest.fixture
+def client():
+    with TestClient(main.app) as client:
+        yield client
+
+
+def _post(client, path, user_id, items):
+    body = {"user_id": user_id, "items": [{"product_id": pid, "quantity": qty} for pid, qty in items]}
+    return client.post(path, json=body)
+
+
+def _add(client, user_id, *items):
+    return _post(client, "/cart/add", user_id, items)
+
+
+def _remove(client, user_id, *items):
+    return _post(client, "/cart/remove", user_id, items)
+
+
+def test_add_merges_duplicate_items(client):
+    response = _add(client, "u1", ("concrete_bag", 2), ("plywood_sheet", 1), ("concrete_bag", 3))
+
+    assert response.json()["items"] == [
+        {"product_id": "concrete_bag", "name": "Concrete Mix 60lb", "quantity": 5},
+        {"product_id": "plywood_sheet", "name": "Plywood 3/4in 4x8", "quantity": 1},
+    ]
+    assert response.json()["total_items"] == 6
+
+
+@pytest.mark.parametrize("path", ["/cart/add", "/cart/remove"])
+def test_unknown_products_leave_cart_unchanged(client, path):
+    _add(client, "u1", ("concrete_bag", 5))
+    response = _post(client, path, "u1", [("concrete_bag", 1), ("nope", 1), ("gone", 2)])
+
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Products not found in catalog: ['nope', 'gone']"
+    assert main._carts["u1"] == {"concrete_bag": 5}
+    assert main._cart_totals["u1"] == 5
+
+
+def test_remove_missing_item_leaves_cart_unchanged(client):
+    _add(client, "u1", ("concrete_bag", 5))
+    response = _remove(client, "u1", ("concrete_bag", 2), ("plywood_sheet", 1))
+
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Plywood 3/4in 4x8 not in cart"
+    assert main._carts["u1"] == {"concrete_bag": 5}
+    assert main._cart_totals["u1"] == 5
+
+
+def test_over_removal_keeps_total_in_sync(client):
+    _add(client, "u1", ("concrete_bag", 5), ("plywood_sheet", 2))
+    response = _remove(client, "u1", ("concrete_bag", 10))
+
+    assert response.json()["items"] == [{"product_id": "plywood_sheet", "name": "Plywood 3/4in 4x8", "quantity": 2}]
+    assert response.json()["total_items"] == 2
+
+    response = _remove(client, "u1", ("plywood_sheet", 3))
+    assert response.json() == {"user_id": "u1", "items": [], "total_items": 0}
+    assert "u1" not in main._cart_totals
+
+
+def test_repeated_add_and_remove_keeps_total_in_sync(client):
+    for _ in range(3):
+        _add(client, "u1", ("concrete_bag", 4))
+        response = _remove(client, "u1", ("concrete_bag", 3))
+        assert response.json()["total_items"] == sum(item["quantity"] for item in response.json()["items"])
+
+    assert main._carts["u1"] == {"concrete_bag": 3}
+    assert response.json()["total_items"] == 3
+
+
+def test_redis_add_increments_hash(redis_store, client):
+    _add(client, "u1", ("concrete_bag", 2))
+    response = _add(client, "u1", ("concrete_bag", 3), ("plywood_sheet", 1))
+
+    assert response.json()["total_items"] == 6
+    assert redis_store.hgetall("cart:u1") == {b"concrete_bag": b"5", b"plywood_sheet": b"1"}
+
+
+def test_redis_remove_is_all_or_nothing(redis_store, client):
+    _add(client, "u1", ("concrete_bag", 5))
+    response = _remove(client, "u1", ("concrete_bag", 2), ("plywood_sheet", 1))
+
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Plywood 3/4in 4x8 not in cart"
+    assert redis_store.hgetall("cart:u1") == {b"concrete_bag": b"5"}
+
+
+def test_redis_remove_deletes_field_at_zero(redis_store, client):
+    _add(client, "u1", ("concrete_bag", 5), ("plywood_sheet", 1))
+    response = _remove(client, "u1", ("concrete_bag", 10))
+
+    assert response.json()["items"] == [{"product_id": "plywood_sheet", "name": "Plywood 3/4in 4x8", "quantity": 1}]
+    assert response.json()["total_items"] == 1
+    assert not redis_store.hexists("cart:u1", "concrete_bag")
+
+
+def test_redis_drops_products_missing_from_catalog(redis_store, client):
+    redis_store.hset("cart:u1", mapping={"discontinued_item": 3, "concrete_bag": 1})
+    response = _add(client, "u1", ("plywood_sheet", 1))
+
+    assert response.status_code == 200
+    assert [item["product_id"] for item in response.json()["items"]] == ["concrete_bag", "plywood_sheet"]
+    assert response.json()["total_items"] == 2
+    assert not redis_store.hexists("cart:u1", "discontinued_item")
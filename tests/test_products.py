@@ -0,0 +1,28 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.main import _CATALOG_ETAG, app
+
+client = TestClient(app)
+
+
+def test_list_products_returns_catalog():
+    response = client.get("/products")
+    assert response.status_code == 200
+    assert response.headers["etag"] == _CATALOG_ETAG
+    assert len(response.json()) == 20
+
+
+@pytest.mark.parametrize(
+    "if_none_match",
+    [_CATALOG_ETAG, f"W/{_CATALOG_ETAG}", "*", f'"other", {_CATALOG_ETAG}', f'"other",W/{_CATALOG_ETAG}'],
+)
+def test_list_products_not_modified(if_none_match):
+    response = client.get("/products", headers={"If-None-Match": if_none_match})
+    assert response.status_code == 304
+    assert response.content == b""
+
+
+def test_list_products_stale_etag():
+    response = client.get("/products", headers={"If-None-Match": '"other"'})
+    assert response.status_code == 200
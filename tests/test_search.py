@@ -0,0 +1,42 @@
+import pytest
+from starlette.requests import Request
+
+from backend.main import _CATALOG_ETAG, _search_cache_key, _search_one, search_products
+
+
+# Typos and partial names a caller should still resolve
+@pytest.mark.parametrize(
+    "query, product_id",
+    [
+        ("plywd", "plywood_sheet"),
+        ("cncrt", "concrete_bag"),
+        ("drwall", "drywall_panel"),
+        ("lumbr", "lumber_2x4"),
+        ("galvanised nail", "galv_nails"),
+        ("shingle bundel", "roof_shingle"),
+        ("toggle swich", "toggle_switch"),
+        ("light fixture", "led_fixture"),
+        ("ply wood", "plywood_sheet"),
+        ("sealant", "primer_gallon"),
+    ],
+)
+def test_fuzzy_hits(query, product_id):
+    product = _search_one(query)
+    assert product is not None and product.id == product_id
+
+
+# Products the store does not carry must be reported as not found
+@pytest.mark.parametrize(
+    "query", ["hammer", "steel", "door", "a", "x", "wire", "sand", "glue", "pcv", "zzzzqqq"]
+)
+def test_fuzzy_misses(query):
+    assert _search_one(query) is None
+
+
+def test_search_cache_key_tracks_catalog_and_query_order():
+    def key(query_string):
+        request = Request({"type": "http", "query_string": query_string, "headers": []})
+        return _search_cache_key(search_products, "catalog:", request=request)
+
+    assert _CATALOG_ETAG in key(b"queries=nails&queries=plywd")
+    assert key(b"queries=nails&queries=plywd") != key(b"queries=plywd&queries=nails")